@@ -0,0 +1,178 @@
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+from fastapi.responses import JSONResponse
+
+# Relative cost of one request, in units of the global in-flight budget and of
+# a client's token bucket. Paths not listed here are not admission controlled.
+ENDPOINT_COSTS: Dict[str, int] = {
+    '/analyze': 8,
+    '/report': 4,
+    '/scribble': 1,
+}
+
+MAX_UPLOAD_BYTES: Dict[str, int] = {
+    '/analyze': int(os.environ.get("ADMISSION_MAX_AUDIO_BYTES", 20 * 1024 * 1024)),
+    '/scribble': int(os.environ.get("ADMISSION_MAX_IMAGE_BYTES", 5 * 1024 * 1024)),
+}
+
+GLOBAL_BUDGET = int(os.environ.get("ADMISSION_BUDGET", 32))
+CLIENT_RATE = float(os.environ.get("ADMISSION_CLIENT_RATE", 4.0))
+CLIENT_BURST = float(os.environ.get("ADMISSION_CLIENT_BURST", 32.0))
+TRUST_FORWARDED = os.environ.get("ADMISSION_TRUST_FORWARDED", "0") == "1"
+MAX_CLIENTS = 10000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, cost: float, now: float) -> float:
+        """Spend ``cost`` tokens; return 0 on success or the seconds until it would succeed."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(self, budget: int = GLOBAL_BUDGET, rate: float = CLIENT_RATE, burst: float = CLIENT_BURST):
+        # A budget or burst below an endpoint's cost would shed it forever.
+        largest = max(ENDPOINT_COSTS.values())
+        if budget < largest:
+            raise ValueError(f"ADMISSION_BUDGET ({budget}) must be at least the largest endpoint cost ({largest})")
+        if burst < largest:
+            raise ValueError(f"ADMISSION_CLIENT_BURST ({burst:g}) must be at least the largest endpoint cost ({largest})")
+        if rate <= 0:
+            raise ValueError("ADMISSION_CLIENT_RATE must be positive")
+        self.budget = budget
+        self.rate = rate
+        self.burst = burst
+        self.in_flight = 0
+        self.counters: Counter = Counter()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    @staticmethod
+    def endpoint(path: str) -> Optional[str]:
+        for prefix in ENDPOINT_COSTS:
+            if path == prefix or path.startswith(prefix + '/'):
+                return prefix
+        return None
+
+    @staticmethod
+    def client_id(scope) -> str:
+        if TRUST_FORWARDED:
+            for name, value in scope.get('headers', []):
+                if name == b'x-forwarded-for':
+                    return value.decode('latin-1').split(',')[0].strip()
+        client = scope.get('client')
+        return client[0] if client else 'unknown'
+
+    def throttle(self, client: str, cost: int) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+            while len(self._buckets) > MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket.take(cost, now)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'in_flight': self.in_flight,
+            'budget': self.budget,
+            'clients': len(self._buckets),
+            'counters': dict(self.counters),
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that sheds expensive requests before their body is read.
+
+    Checks run in order: declared upload size (413), the global in-flight
+    budget (503) and the client's token bucket (429), so a shed request
+    doesn't spend the client's tokens. Bodies without a
+    Content-Length are counted as they stream in.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def _reject(self, scope, receive, send, endpoint, status_code, detail, retry_after=None):
+        self.controller.counters[f'{endpoint}:{status_code}'] += 1
+        headers = {'Retry-After': str(max(1, int(retry_after + 0.999)))} if retry_after is not None else None
+        response = JSONResponse({'detail': detail}, status_code=status_code, headers=headers)
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        endpoint = self.controller.endpoint(scope['path'])
+        if endpoint is None:
+            return await self.app(scope, receive, send)
+
+        cost = ENDPOINT_COSTS[endpoint]
+        limit = MAX_UPLOAD_BYTES.get(endpoint)
+
+        if limit is not None:
+            for name, value in scope.get('headers', []):
+                if name == b'content-length' and value.isdigit() and int(value) > limit:
+                    return await self._reject(scope, receive, send, endpoint, 413, "Upload too large")
+
+        if self.controller.in_flight + cost > self.controller.budget:
+            return await self._reject(scope, receive, send, endpoint, 503, "Server busy", 1)
+
+        wait = self.controller.throttle(self.controller.client_id(scope), cost)
+        if wait > 0:
+            return await self._reject(scope, receive, send, endpoint, 429, "Rate limit exceeded", wait)
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if limit is not None and message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit:
+                    # Stop reading; whatever error the app makes of this is
+                    # replaced by a 413 in limited_send.
+                    exceeded = True
+                    return {'type': 'http.disconnect'}
+            return message
+
+        async def limited_send(message):
+            nonlocal started
+            if exceeded:
+                if message['type'] == 'http.response.start' and not started:
+                    started = True
+                    await self._reject(scope, receive, send, endpoint, 413, "Upload too large")
+                return
+            if message['type'] == 'http.response.start':
+                started = True
+            await send(message)
+
+        self.controller.in_flight += cost
+        self.controller.counters[f'{endpoint}:admitted'] += 1
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except Exception:
+            if not exceeded or started:
+                raise
+        finally:
+            self.controller.in_flight -= cost
+
+        if exceeded and not started:
+            await self._reject(scope, receive, send, endpoint, 413, "Upload too large")
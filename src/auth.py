@@ -0,0 +1,11 @@
+import os
+import hmac
+from typing import Optional
+
+
+def token_valid(token: Optional[str], env_name: str = "ADMIN_TOKEN") -> bool:
+    """Check ``token`` against the secret in ``env_name``; always False when none is configured."""
+    expected = os.environ.get(env_name)
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode(), expected.encode())
@@ -0,0 +1,80 @@
+import math
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+
+_ALIASES = {
+    'application/x-msgpack': MSGPACK,
+    'application/vnd.msgpack': MSGPACK,
+}
+
+
+def available_media_types():
+    types = [JSON]
+    if msgpack is not None:
+        types.append(MSGPACK)
+    if cbor2 is not None:
+        types.append(CBOR)
+    return types
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Pick the response media type from an Accept header, defaulting to JSON."""
+    if not accept:
+        return JSON
+
+    supported = available_media_types()
+    ranked = []
+    for position, part in enumerate(accept.split(',')):
+        fields = [field.strip() for field in part.split(';')]
+        media_type = _ALIASES.get(fields[0].lower(), fields[0].lower())
+        quality = 1.0
+        for param in fields[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            ranked.append((-quality, position, media_type))
+
+    for _, _, media_type in sorted(ranked):
+        if media_type in supported:
+            return media_type
+        if media_type in ('*/*', 'application/*'):
+            return JSON
+    return JSON
+
+
+def _finite(data: Any) -> Any:
+    # JSON has no NaN/Infinity, and Praat reports a missing formant as NaN.
+    if isinstance(data, float):
+        return data if math.isfinite(data) else None
+    if isinstance(data, dict):
+        return {key: _finite(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_finite(value) for value in data]
+    return data
+
+
+def encode(data: Any, media_type: str = JSON, status_code: int = 200) -> Response:
+    data = _finite(data)
+    if media_type == MSGPACK:
+        return Response(msgpack.packb(data, use_bin_type=True), status_code=status_code, media_type=MSGPACK)
+    if media_type == CBOR:
+        return Response(cbor2.dumps(data), status_code=status_code, media_type=CBOR)
+    return JSONResponse(data, status_code=status_code)
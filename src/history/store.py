@@ -0,0 +1,166 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+HISTORY_DB = os.environ.get("HISTORY_DB", "patient_history.sqlite3")
+SECONDS_PER_DAY = 86400.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS visits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id TEXT NOT NULL,
+    clinic_id TEXT,
+    kind TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metric_values (
+    visit_id INTEGER NOT NULL REFERENCES visits(id),
+    patient_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metric_values_series ON metric_values (patient_id, metric, recorded_at);
+CREATE TABLE IF NOT EXISTS metric_stats (
+    patient_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    clinic_id TEXT,
+    n INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL,
+    baseline REAL NOT NULL,
+    latest REAL NOT NULL,
+    first_at REAL NOT NULL,
+    last_at REAL NOT NULL,
+    sum_t REAL NOT NULL,
+    sum_tt REAL NOT NULL,
+    sum_ty REAL NOT NULL,
+    PRIMARY KEY (patient_id, metric)
+);
+CREATE INDEX IF NOT EXISTS metric_stats_clinic ON metric_stats (clinic_id, metric);
+"""
+
+_STAT_COLUMNS = ['patient_id', 'metric', 'clinic_id', 'n', 'mean', 'm2', 'baseline', 'latest',
+                 'first_at', 'last_at', 'sum_t', 'sum_tt', 'sum_ty']
+
+
+def _summarize(row: Dict[str, Any]) -> Dict[str, Any]:
+    n = row['n']
+    # Least-squares slope of value against days since the first visit.
+    denominator = n * row['sum_tt'] - row['sum_t'] ** 2
+    slope = (n * row['sum_ty'] - row['sum_t'] * row['mean'] * n) / denominator if denominator > 1e-12 else None
+    return {
+        'patient_id': row['patient_id'],
+        'clinic_id': row['clinic_id'],
+        'metric': row['metric'],
+        'visits': n,
+        'mean': row['mean'],
+        'std': math.sqrt(row['m2'] / (n - 1)) if n > 1 else 0.0,
+        'baseline': row['baseline'],
+        'latest': row['latest'],
+        'change_from_baseline': row['latest'] - row['baseline'],
+        'slope_per_day': slope,
+        'first_visit': row['first_at'],
+        'last_visit': row['last_at'],
+    }
+
+
+class PatientHistory:
+    """SQLite store of per-patient results with rolling statistics kept up to date on append.
+
+    Each append updates one ``metric_stats`` row per metric (count, Welford
+    mean/variance, baseline, latest and regression sums), so trend queries
+    never rescan a patient's visits.
+    """
+
+    def __init__(self, path: str = HISTORY_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def append(self, patient_id: str, kind: str, result: Dict[str, Any], metrics: Dict[str, float],
+               clinic_id: Optional[str] = None, recorded_at: Optional[float] = None) -> int:
+        recorded_at = time.time() if recorded_at is None else recorded_at
+        with self._lock, self._connection as db:
+            visit_id = db.execute(
+                "INSERT INTO visits (patient_id, clinic_id, kind, recorded_at, result) VALUES (?, ?, ?, ?, ?)",
+                (patient_id, clinic_id, kind, recorded_at, json.dumps(result)),
+            ).lastrowid
+
+            for metric, value in metrics.items():
+                value = float(value)
+                # Praat reports a missing formant as NaN; SQLite would store it
+                # as NULL and it would poison the running statistics.
+                if not math.isfinite(value):
+                    continue
+                db.execute(
+                    "INSERT INTO metric_values (visit_id, patient_id, metric, recorded_at, value) VALUES (?, ?, ?, ?, ?)",
+                    (visit_id, patient_id, metric, recorded_at, value),
+                )
+                row = db.execute(
+                    "SELECT * FROM metric_stats WHERE patient_id = ? AND metric = ?", (patient_id, metric)
+                ).fetchone()
+                db.execute(
+                    f"INSERT OR REPLACE INTO metric_stats ({', '.join(_STAT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(_STAT_COLUMNS))})",
+                    self._updated(row, patient_id, metric, clinic_id, recorded_at, value),
+                )
+        return visit_id
+
+    @staticmethod
+    def _updated(row, patient_id, metric, clinic_id, recorded_at, value) -> Tuple:
+        if row is None:
+            return (patient_id, metric, clinic_id, 1, value, 0.0, value, value,
+                    recorded_at, recorded_at, 0.0, 0.0, 0.0)
+
+        n = row['n'] + 1
+        delta = value - row['mean']
+        mean = row['mean'] + delta / n
+        m2 = row['m2'] + delta * (value - mean)
+        t = (recorded_at - row['first_at']) / SECONDS_PER_DAY
+        return (patient_id, metric, clinic_id or row['clinic_id'], n, mean, m2, row['baseline'], value,
+                row['first_at'], recorded_at, row['sum_t'] + t, row['sum_tt'] + t * t, row['sum_ty'] + t * value)
+
+    def trends(self, patient_id: str) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM metric_stats WHERE patient_id = ?", (patient_id,)
+            ).fetchall()
+        return {row['metric']: _summarize(dict(row)) for row in rows}
+
+    def recent(self, patient_id: str, metric: str, limit: int = 10) -> List[Tuple[float, float]]:
+        """Last ``limit`` values of one metric, oldest first."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT recorded_at, value FROM metric_values WHERE patient_id = ? AND metric = ? "
+                "ORDER BY recorded_at DESC LIMIT ?",
+                (patient_id, metric, limit),
+            ).fetchall()
+        return [(row['recorded_at'], row['value']) for row in reversed(rows)]
+
+    def clinic_trends(self, clinic_id: str, metric: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM metric_stats WHERE clinic_id = ? AND metric = ?", (clinic_id, metric)
+            ).fetchall()
+        patients = [_summarize(dict(row)) for row in rows]
+        slopes = [p['slope_per_day'] for p in patients if p['slope_per_day'] is not None]
+        changes = [p['change_from_baseline'] for p in patients]
+        return {
+            'clinic_id': clinic_id,
+            'metric': metric,
+            'patients': patients,
+            'mean_slope_per_day': sum(slopes) / len(slopes) if slopes else None,
+            'mean_change_from_baseline': sum(changes) / len(changes) if changes else None,
+        }
@@ -3,14 +3,22 @@ import logging
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Suppress TensorFlow logging
 logging.getLogger('tensorflow').setLevel(logging.ERROR)
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Header, Depends, Form
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
-import parselmouth
 import numpy as np
 import traceback
-from typing import Dict, Any, List
-from src.pdf.report import create_report
+from typing import Dict, Any, List, Optional
+from src.pdf.cache import ReportCache
+from src.history.store import PatientHistory
+from src.encoding import negotiate, encode
+from src.admission import AdmissionController, AdmissionMiddleware
+from src.auth import token_valid
+from src.profiling import ProfilingMiddleware, timed, tf_trace, list_profiles, archive_profile
+from src.voice.features import extract_features
+from src.voice.audio import AudioTooLong
+from src.voice.heuristic import THRESHOLDS, explain as explain_margins
+from src.scribble.saliency import make_explainer, calibrate, downsample, CALIBRATED
 from tensorflow.keras.models import load_model
 from PIL import Image
 import io
@@ -21,6 +29,15 @@ app = FastAPI()
 
 labels: List[str] = ['Healthy', 'Parkinson']
 
+report_cache = ReportCache()
+history = PatientHistory()
+REPORT_HEADERS = {"Content-Disposition": "attachment; filename=voice_analysis_report.pdf"}
+
+app.add_middleware(ProfilingMiddleware)
+
+admission = AdmissionController()
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -34,26 +51,35 @@ async def index():
     return {"message": "Welcome to the Audio Analysis API"}
 
 @app.post("/analyze")
-async def analyze_and_predict(file: UploadFile = File(...)):
+async def analyze_and_predict(file: UploadFile = File(...), explain: bool = False, mode: str = 'features',
+                              patient_id: Optional[str] = Form(None), clinic_id: Optional[str] = Form(None),
+                              accept: Optional[str] = Header(None), x_clinic_token: Optional[str] = Header(None),
+                              x_admin_token: Optional[str] = Header(None)):
     if not file:
         raise HTTPException(status_code=400, detail="No file provided")
+    if patient_id:
+        # Visits land in the patient's record and reports, so only clinics may add them.
+        require_clinic(x_clinic_token, x_admin_token)
 
     try:
         upload_directory = 'temp'
         os.makedirs(upload_directory, exist_ok=True)
 
         file_path = os.path.join(upload_directory, file.filename)
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        try:
+            with open(file_path, "wb") as buffer:
+                content = await file.read()
+                buffer.write(content)
 
-        analysis_results = analyze_audio(file_path)
+            analysis_results = analyze_audio(file_path)
+        finally:
+            # Rejected and failed uploads must not pile up in temp/.
+            if os.path.exists(file_path):
+                os.remove(file_path)
 
         with open('a.txt', 'w') as f:
             f.write(str(analysis_results))
 
-        os.remove(file_path)
-
         input_data = {
             'mean_pitch': round(analysis_results['mean_pitch'], 2),
             'mean_intensity': round(analysis_results['mean_intensity'], 2),
@@ -62,13 +88,7 @@ async def analyze_and_predict(file: UploadFile = File(...)):
             'f3': round(analysis_results['f3'], 2)
         }
 
-        thresholds = {
-            'pitch': 116.09,
-            'intensity': 67.89,
-            'f1': 1343.93,
-            'f2': 1688.41,
-            'f3': 1495.40
-        }
+        thresholds = dict(THRESHOLDS)
 
         prediction = heuristic_model(
             input_data['mean_pitch'],
@@ -82,11 +102,11 @@ async def analyze_and_predict(file: UploadFile = File(...)):
         result = "Parkinson's" if prediction == 1 else "Not Parkinson's"
         detected = "High" if prediction == 1 else "Low"
 
-        create_report(detected=detected, pitch=input_data['mean_pitch'],
-                      intensity=input_data['mean_intensity'],
-                      f1=input_data['f1'],
-                      f2=input_data['f2'],
-                      f3=input_data['f3'],)
+        report_params = dict(detected=detected, pitch=input_data['mean_pitch'],
+                             intensity=input_data['mean_intensity'],
+                             f1=input_data['f1'],
+                             f2=input_data['f2'],
+                             f3=input_data['f3'])
         print(detected, input_data['mean_intensity'], input_data['mean_pitch'], input_data['f1'], input_data['f2'], input_data['f3'])
         differences = {
             'pitch_diff': round(input_data['mean_pitch'] - thresholds['pitch'], 2),
@@ -103,22 +123,51 @@ async def analyze_and_predict(file: UploadFile = File(...)):
             'differences': differences
         }
 
-        with open('b.txt', 'w') as f:
-            f.write(str(response_data))
-        headers = {"Content-Disposition": "attachment; filename=voice_analysis_report.pdf"}
-        return FileResponse('voice_analysis_report.pdf', media_type="application/pdf", headers=headers)
+        if explain:
+            features = [[input_data[key] for key in ('mean_pitch', 'mean_intensity', 'f1', 'f2', 'f3')]]
+            overall, feature_scores = explain_margins(features, thresholds)
+            response_data['explanation'] = {
+                'score': round(float(overall[0]), 4),
+                'feature_scores': {
+                    key: round(float(value), 4)
+                    for key, value in zip(thresholds, feature_scores[0])
+                },
+            }
 
+        if patient_id:
+            history.append(patient_id, 'voice', response_data,
+                           metrics={**input_data, 'voice_positive': prediction},
+                           clinic_id=clinic_id)
+            report_params['pitch_history'] = [value for _, value in history.recent(patient_id, 'mean_pitch')]
+            report_params['intensity_history'] = [value for _, value in history.recent(patient_id, 'mean_intensity')]
+
+        report_id = report_cache.register(report_params, private=bool(patient_id))
+        response_data['report_id'] = report_id
+        response_data['report_url'] = f"/report/{report_id}"
+
+        # /results is unauthenticated, so patient visits are not published there.
+        if not patient_id:
+            with open('b.txt', 'w') as f:
+                f.write(str(response_data))
+
+        if mode == 'report':
+            pdf = await report_cache.get(report_id)
+            return Response(pdf, media_type="application/pdf", headers=REPORT_HEADERS)
+        return encode(response_data, negotiate(accept))
+
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/results")
-async def results():
+async def results(accept: Optional[str] = Header(None)):
     try:
         with open('b.txt', 'r') as f:
             data = eval(f.read())
-        return data
+        return encode(data, negotiate(accept))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -135,42 +184,90 @@ def heuristic_model(mean_pitch: float, mean_intensity: float, f1: float, f2: flo
 
 def analyze_audio(file_path: str) -> Dict[str, Any]:
     try:
+        return extract_features(file_path)
+
+    except AudioTooLong as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
 
-        sound = parselmouth.Sound(file_path)
 
-        pitch = sound.to_pitch()
-        pitch_values = pitch.selected_array['frequency']
-        pitch_values = pitch_values[pitch_values != 0]
-        mean_pitch = np.mean(pitch_values) if len(pitch_values) > 0 else 0
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not token_valid(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
 
-        intensity = sound.to_intensity()
-        intensity_values = intensity.values
-        mean_intensity = np.mean(intensity_values)
 
-        formants = sound.to_formant_burg()
-        midpoint = sound.duration / 2
+def require_clinic(x_clinic_token: Optional[str] = Header(None), x_admin_token: Optional[str] = Header(None)):
+    if not (token_valid(x_clinic_token, "CLINIC_TOKEN") or token_valid(x_admin_token)):
+        raise HTTPException(status_code=403, detail="Clinic token required")
 
-        f1 = formants.get_value_at_time(1, midpoint)
-        f2 = formants.get_value_at_time(2, midpoint)
-        f3 = formants.get_value_at_time(3, midpoint)
 
-        return {
-            'mean_pitch': float(mean_pitch),
-            'mean_intensity': float(mean_intensity),
-            'f1': float(f1),
-            'f2': float(f2),
-            'f3': float(f3),
-        }
+@app.get('/admin/admission', dependencies=[Depends(require_admin)])
+async def admission_stats():
+    return admission.stats()
+
+
+@app.get('/admin/profiles', dependencies=[Depends(require_admin)])
+async def profiles():
+    return list_profiles()
+
+
+@app.get('/admin/profiles/{profile_id}', dependencies=[Depends(require_admin)])
+async def profile_download(profile_id: str):
+    archive = archive_profile(profile_id)
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Unknown profile id")
+    headers = {"Content-Disposition": f"attachment; filename=profile_{profile_id}.zip"}
+    return Response(archive, media_type="application/zip", headers=headers)
 
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
 
+@app.get('/patients/{patient_id}/trends', dependencies=[Depends(require_clinic)])
+async def patient_trends(patient_id: str, accept: Optional[str] = Header(None)):
+    trends = history.trends(patient_id)
+    if not trends:
+        raise HTTPException(status_code=404, detail="Unknown patient id")
+    return encode(trends, negotiate(accept))
 
-@app.get('/report')
+
+@app.get('/patients/{patient_id}/history', dependencies=[Depends(require_clinic)])
+async def patient_history(patient_id: str, metric: str = 'mean_pitch', limit: int = 10,
+                          accept: Optional[str] = Header(None)):
+    values = history.recent(patient_id, metric, min(max(limit, 1), 1000))
+    return encode([{'recorded_at': t, 'value': v} for t, v in values], negotiate(accept))
+
+
+@app.get('/clinics/{clinic_id}/trends', dependencies=[Depends(require_clinic)])
+async def clinic_trends(clinic_id: str, metric: str = 'mean_pitch', accept: Optional[str] = Header(None)):
+    return encode(history.clinic_trends(clinic_id, metric), negotiate(accept))
+
+
+@app.get('/report', dependencies=[Depends(require_clinic)])
 async def reports():
-    headers = {"Content-Disposition": "attachment; filename=voice_analysis_report.pdf"}
-    return FileResponse('voice_analysis_report.pdf', media_type="application/pdf", headers=headers)
+    if report_cache.latest_id is None:
+        raise HTTPException(status_code=404, detail="No report available")
+    return await report_response(report_cache.latest_id)
+
+
+@app.get('/report/{report_id}')
+async def report_by_id(report_id: str, x_clinic_token: Optional[str] = Header(None),
+                       x_admin_token: Optional[str] = Header(None)):
+    if report_id not in report_cache:
+        raise HTTPException(status_code=404, detail="Unknown report id")
+    if report_cache.is_private(report_id):
+        require_clinic(x_clinic_token, x_admin_token)
+    return await report_response(report_id)
+
+
+async def report_response(report_id: str) -> Response:
+    try:
+        pdf = await report_cache.get(report_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown report id")
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(pdf, media_type="application/pdf", headers=REPORT_HEADERS)
 
 
 def preprocess_image(image):
@@ -186,44 +283,68 @@ def preprocess_image(image):
 
 
 model = load_model('src/scribble/parkinson_disease_detection.h5')
+explainer = make_explainer(model)
 
 
 @app.post("/scribble")
-async def scribble(file: UploadFile = File(...)):
+async def scribble(file: UploadFile = File(...), explain: bool = False, patient_id: Optional[str] = Form(None),
+                   clinic_id: Optional[str] = Form(None), accept: Optional[str] = Header(None),
+                   x_clinic_token: Optional[str] = Header(None), x_admin_token: Optional[str] = Header(None)):
+    if patient_id:
+        require_clinic(x_clinic_token, x_admin_token)
+    media_type = negotiate(accept)
     try:
 
         if not file.content_type.startswith('image/'):
-            return {
+            return encode({
                 "error": "Uploaded file must be an image",
                 "status": "error"
-            }
+            }, media_type)
 
         contents = await file.read()
         image = Image.open(io.BytesIO(contents))
 
-        processed_image = preprocess_image(image)
+        with timed('preprocess_image'):
+            processed_image = preprocess_image(image)
 
         if processed_image.shape != (1, 128, 128, 1):
-            return {
+            return encode({
                 "error": f"Invalid image shape after processing: {processed_image.shape}",
                 "status": "error"
-            }
-
-        prediction = model.predict(processed_image)
+            }, media_type)
+
+        with tf_trace('model_predict'):
+            if explain:
+                probabilities, saliency = explainer(tf.constant(processed_image, dtype=tf.float32))
+                prediction = calibrate(probabilities.numpy())
+            else:
+                prediction = calibrate(model.predict(processed_image))
         predicted_class = int(np.argmax(prediction[0], axis=0))
         confidence = float(prediction[0][predicted_class])
-        return {
+        response = {
             "prediction": labels[predicted_class],
             "has_parkinsons": bool(predicted_class == 1),
             "confidence": confidence,
+            # False until a temperature is fitted on held-out spirals.
+            "calibrated": CALIBRATED,
             "status": "success"
         }
+        if patient_id:
+            history.append(patient_id, 'scribble', dict(response),
+                           metrics={'scribble_parkinson_probability': float(prediction[0][1])},
+                           clinic_id=clinic_id)
+        if explain:
+            response["probabilities"] = {
+                label: round(float(p), 4) for label, p in zip(labels, prediction[0])
+            }
+            response["saliency"] = np.round(downsample(saliency.numpy()[0]), 3).tolist()
+        return encode(response, media_type)
 
     except Exception as e:
-        return {
+        return encode({
             "error": str(e),
             "status": "error"
-        }
+        }, media_type)
 
 
 if __name__ == "__main__":
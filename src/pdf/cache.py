@@ -0,0 +1,96 @@
+import os
+import uuid
+import asyncio
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Set
+
+from fastapi.concurrency import run_in_threadpool
+
+from src.pdf.report import create_report
+from src.profiling import timed
+
+# pyplot keeps global figure state, so renders in the thread pool take turns.
+_render_lock = threading.Lock()
+
+
+def _render_pdf(params: Dict[str, Any]) -> bytes:
+    with _render_lock, tempfile.TemporaryDirectory() as directory:
+        pdf_filename = os.path.join(directory, "voice_analysis_report.pdf")
+        with timed('create_report'):
+            create_report(**params, pdf_filename=pdf_filename)
+        with open(pdf_filename, 'rb') as f:
+            return f.read()
+
+
+class ReportCache:
+    """Renders voice reports on first fetch and keeps the most recent PDFs in memory.
+
+    ``register`` only stores the ``create_report`` arguments. Concurrent
+    ``get`` calls for the same id share a single render.
+    """
+
+    def __init__(self, max_reports: int = 1024, max_rendered: int = 64):
+        self.max_reports = max_reports
+        self.max_rendered = max_rendered
+        self._params: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._rendered: "OrderedDict[str, bytes]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._private: Set[str] = set()
+        self.latest_id = None
+
+    def register(self, params: Dict[str, Any], private: bool = False) -> str:
+        """Store report arguments; ``private`` marks reports built from a patient's history."""
+        report_id = uuid.uuid4().hex
+        self._params[report_id] = params
+        if private:
+            self._private.add(report_id)
+        self.latest_id = report_id
+        while len(self._params) > self.max_reports:
+            stale_id, _ = self._params.popitem(last=False)
+            self._rendered.pop(stale_id, None)
+            self._private.discard(stale_id)
+        return report_id
+
+    def __contains__(self, report_id: str) -> bool:
+        return report_id in self._params
+
+    def is_private(self, report_id: str) -> bool:
+        return report_id in self._private
+
+    async def get(self, report_id: str) -> bytes:
+        if report_id in self._rendered:
+            self._rendered.move_to_end(report_id)
+            return self._rendered[report_id]
+
+        task = self._inflight.get(report_id)
+        if task is None:
+            params = self._params.get(report_id)
+            if params is None:
+                raise KeyError(report_id)
+            # The render runs as its own task so a cancelled caller never
+            # leaves the other waiters hanging.
+            task = asyncio.ensure_future(self._render(report_id, params))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[report_id] = task
+        return await asyncio.shield(task)
+
+    async def _render(self, report_id: str, params: Dict[str, Any]) -> bytes:
+        try:
+            pdf = await run_in_threadpool(_render_pdf, params)
+        finally:
+            del self._inflight[report_id]
+
+        if report_id in self._params:
+            self._rendered[report_id] = pdf
+            while len(self._rendered) > self.max_rendered:
+                self._rendered.popitem(last=False)
+        return pdf
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'registered': len(self._params),
+            'rendered': len(self._rendered),
+            'rendering': len(self._inflight),
+        }
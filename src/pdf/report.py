@@ -12,12 +12,12 @@ from reportlab.platypus import Image,KeepTogether
 import matplotlib.pyplot as plt
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
-import random
 
 
 
-def create_report(detected,pitch,intensity,f1,f2,f3):
-    pdf_filename = "voice_analysis_report.pdf"
+def create_report(detected,pitch,intensity,f1,f2,f3,pdf_filename="voice_analysis_report.pdf",
+                  pitch_history=None,intensity_history=None):
+    graph_prefix = os.path.splitext(pdf_filename)[0]
     
     try:
         
@@ -201,26 +201,24 @@ The average vocal intensity maintains within the expected range, indicating adeq
 • Maintain regular exercise and healthy lifestyle<br/>
 • Report any new voice-related concerns to healthcare provider"""
             elements.append(Paragraph(recommendations, normal_style))
-        try:
-            pitch_values = [(pitch - 5)+random.randint(0,5), (pitch - 2)+random.randint(0,5), pitch+random.randint(0,5), (pitch + 1)+random.randint(0,5), (pitch + 2)+random.randint(0,5)]
-            pitch_times = list(range(5))  
+        # Histories are the patient's recent visits, oldest first, ending with
+        # this one. Without a patient we only have the current measurement.
+        pitch_values = list(pitch_history) if pitch_history else [pitch]
+        pitch_times = list(range(1, len(pitch_values) + 1))
+
+        intensity_values = list(intensity_history) if intensity_history else [intensity]
+        intensity_times = list(range(1, len(intensity_values) + 1))
 
-        
-            intensity_values = [(intensity - 5.5)+random.randint(0,5), (intensity - 1.75)+random.randint(0,5), (intensity)+random.randint(0,5), (intensity + 1.75)+random.randint(0,5), (intensity + 4.5)+random.randint(0,5)]
-            intensity_times = list(range(5))  
-        except:
-            print("Count not plot")
-        
         plt.figure(figsize=(8, 4))
         plt.plot(pitch_times, pitch_values, 'r-', marker='o', label='Pitch (Hz)')
         plt.title('Pitch Variation Over Time')
-        plt.xlabel('Time Points')
+        plt.xlabel('Visit')
         plt.ylabel('Pitch (Hz)')
         plt.grid(True)
         plt.legend()
 
    
-        pitch_graph = "pitch_graph.png"
+        pitch_graph = f"{graph_prefix}_pitch_graph.png"
         plt.savefig(pitch_graph)
         plt.close()
 
@@ -228,13 +226,13 @@ The average vocal intensity maintains within the expected range, indicating adeq
         plt.figure(figsize=(8, 4))
         plt.plot(intensity_times, intensity_values, 'b-', marker='o', label='Intensity (dB)')
         plt.title('Intensity Variation Over Time')
-        plt.xlabel('Time Points')
+        plt.xlabel('Visit')
         plt.ylabel('Intensity (dB)')
         plt.grid(True)
         plt.legend()
 
       
-        intensity_graph = "intensity_graph.png"
+        intensity_graph = f"{graph_prefix}_intensity_graph.png"
         plt.savefig(intensity_graph)
         plt.close()
 
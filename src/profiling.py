@@ -0,0 +1,178 @@
+import io
+import os
+import json
+import time
+import uuid
+import shutil
+import pstats
+import cProfile
+import zipfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from src.auth import token_valid
+
+PROFILE_ALL = os.environ.get("PROFILE_REQUESTS", "0") == "1"
+PROFILE_DIRECTORY = os.environ.get("PROFILE_DIRECTORY", "profiles")
+MAX_PROFILES = int(os.environ.get("PROFILE_MAX_TRACES", 50))
+PROFILE_HEADER = b'x-profile'
+ADMIN_HEADER = b'x-admin-token'
+
+# Only one cProfile / TensorFlow profiler session can run per process at once;
+# concurrent profiled requests still get their per-call timings.
+_cprofile_lock = threading.Lock()
+_tf_lock = threading.Lock()
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.directory = os.path.join(PROFILE_DIRECTORY, self.id)
+        self.timings: List[Dict[str, object]] = []
+        os.makedirs(self.directory, exist_ok=True)
+
+    def save(self, wall: float) -> None:
+        with open(os.path.join(self.directory, 'timings.json'), 'w') as f:
+            json.dump({
+                'id': self.id,
+                'method': self.method,
+                'path': self.path,
+                'wall': wall,
+                'calls': self.timings,
+            }, f, indent=2)
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar('request_profile', default=None)
+
+
+@contextmanager
+def timed(name: str):
+    """Record wall and CPU time of the block on the current request's profile, if any."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        profile.timings.append({
+            'name': name,
+            'wall': time.perf_counter() - wall,
+            'cpu': time.thread_time() - cpu,
+        })
+
+
+@contextmanager
+def tf_trace(name: str = 'tensorflow'):
+    """Capture a TensorFlow profiler trace around the block when the request is profiled."""
+    profile = _current.get()
+    if profile is None or not _tf_lock.acquire(blocking=False):
+        with timed(name):
+            yield
+        return
+
+    import tensorflow as tf
+    try:
+        tf.profiler.experimental.start(os.path.join(profile.directory, name))
+        try:
+            with timed(name):
+                yield
+        finally:
+            tf.profiler.experimental.stop()
+    finally:
+        _tf_lock.release()
+
+
+def _prune():
+    entries = [os.path.join(PROFILE_DIRECTORY, name) for name in os.listdir(PROFILE_DIRECTORY)]
+    entries = sorted((e for e in entries if os.path.isdir(e)), key=os.path.getmtime)
+    for stale in entries[:max(0, len(entries) - MAX_PROFILES)]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def list_profiles() -> List[Dict[str, object]]:
+    if not os.path.isdir(PROFILE_DIRECTORY):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIRECTORY)):
+        timings_path = os.path.join(PROFILE_DIRECTORY, name, 'timings.json')
+        if os.path.exists(timings_path):
+            with open(timings_path) as f:
+                summary = json.load(f)
+            profiles.append({key: summary[key] for key in ('id', 'method', 'path', 'wall')})
+    return profiles
+
+
+def archive_profile(profile_id: str) -> Optional[bytes]:
+    if not profile_id.isalnum():
+        return None
+    directory = os.path.join(PROFILE_DIRECTORY, profile_id)
+    if not os.path.isdir(directory):
+        return None
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                archive.write(path, os.path.relpath(path, directory))
+    return buffer.getvalue()
+
+
+class ProfilingMiddleware:
+    """Profile admin requests sent with ``X-Profile: 1``, or every request when PROFILE_REQUESTS=1.
+
+    A per-request ``X-Profile`` is ignored unless ``X-Admin-Token`` is valid.
+    Each profiled request gets a directory with a cProfile dump and text
+    summary, per-call timings from ``timed``/``tf_trace`` and any TensorFlow
+    trace. Its id is returned in the ``X-Profile-Id`` response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'].startswith('/admin/'):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get('headers', []))
+        # Profiling costs CPU and disk, so only admins may ask for it per request.
+        requested = (headers.get(PROFILE_HEADER, b'0') not in (b'', b'0')
+                     and token_valid(headers.get(ADMIN_HEADER, b'').decode('latin-1')))
+        if not (PROFILE_ALL or requested):
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope['method'], scope['path'])
+        token = _current.set(profile)
+
+        async def tagged_send(message):
+            if message['type'] == 'http.response.start':
+                message.setdefault('headers', [])
+                message['headers'] = list(message['headers']) + [(b'x-profile-id', profile.id.encode())]
+            await send(message)
+
+        # cProfile sees every coroutine the event loop runs meanwhile, not
+        # just this request's; keep that in mind under concurrent load.
+        profiler = cProfile.Profile() if _cprofile_lock.acquire(blocking=False) else None
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            await self.app(scope, receive, tagged_send)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _cprofile_lock.release()
+            _current.reset(token)
+            profile.save(time.perf_counter() - started)
+            if profiler is not None:
+                profiler.dump_stats(os.path.join(profile.directory, 'request.pstats'))
+                summary = io.StringIO()
+                pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(50)
+                with open(os.path.join(profile.directory, 'request.txt'), 'w') as f:
+                    f.write(summary.getvalue())
+            _prune()
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import argparse
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calibration.json')
+# parkinson's_disease_detection.py passes this set as validation_data while
+# training, so the model has already been tuned against it.
+VALIDATION_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataset', 'test_set.npz')
+
+
+def _load_temperature() -> Optional[float]:
+    if "SCRIBBLE_TEMPERATURE" in os.environ:
+        return float(os.environ["SCRIBBLE_TEMPERATURE"])
+    if os.path.exists(CALIBRATION_FILE):
+        with open(CALIBRATION_FILE) as f:
+            return float(json.load(f)['temperature'])
+    return None
+
+
+# Softmax temperature applied to the CNN output, fitted by
+# ``python -m src.scribble.saliency --calibrate <spirals.npz>`` on spirals the
+# model never saw in training or validation. None of those ship with the
+# repo, so until one is fitted the confidences are the raw softmax output.
+_FITTED_TEMPERATURE = _load_temperature()
+CALIBRATED = _FITTED_TEMPERATURE is not None
+TEMPERATURE = _FITTED_TEMPERATURE if CALIBRATED else 1.0
+
+
+def make_explainer(model, input_shape=(128, 128, 1)):
+    """Build a traced function returning class probabilities and saliency in one pass.
+
+    Saliency is the absolute gradient of the top class probability with
+    respect to the input pixels, normalised to [0, 1] per image.
+    """
+
+    @tf.function(input_signature=[tf.TensorSpec([None, *input_shape], tf.float32)])
+    def explain(images):
+        with tf.GradientTape() as tape:
+            tape.watch(images)
+            probabilities = model(images, training=False)
+            top = tf.reduce_max(probabilities, axis=-1)
+        gradients = tape.gradient(top, images)
+        saliency = tf.reduce_max(tf.abs(gradients), axis=-1)
+        peak = tf.reduce_max(saliency, axis=[1, 2], keepdims=True)
+        saliency = tf.math.divide_no_nan(saliency, peak)
+        return probabilities, saliency
+
+    return explain
+
+
+def calibrate(probabilities: np.ndarray, temperature: float = TEMPERATURE) -> np.ndarray:
+    if temperature == 1.0:
+        return probabilities
+    logits = np.log(np.clip(probabilities, 1e-12, 1.0)) / temperature
+    logits -= logits.max(axis=-1, keepdims=True)
+    scaled = np.exp(logits)
+    return scaled / scaled.sum(axis=-1, keepdims=True)
+
+
+def fit_temperature(probabilities: np.ndarray, labels: np.ndarray,
+                    grid: np.ndarray = np.linspace(0.25, 5.0, 96)) -> float:
+    """Temperature minimising the negative log-likelihood of ``labels``."""
+    labels = np.asarray(labels, dtype=int)
+    losses = [
+        -np.mean(np.log(np.clip(calibrate(probabilities, t)[np.arange(len(labels)), labels], 1e-12, 1.0)))
+        for t in grid
+    ]
+    return float(grid[int(np.argmin(losses))])
+
+
+def load_calibration_set(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Spirals preprocessed the way ``/scribble`` does, with 0 = healthy, 1 = parkinson.
+
+    Refuses the training script's validation set: a temperature fitted there
+    would only describe data the model was already tuned on.
+    """
+    if os.path.exists(VALIDATION_SET) and os.path.samefile(path, VALIDATION_SET):
+        raise ValueError(f"{path} was used as validation data during training; calibrate on held-out spirals")
+    data = np.load(path, allow_pickle=True)
+    images = []
+    for image in data['arr_0']:
+        image = np.asarray(image)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        images.append(cv2.resize(image, (128, 128)))
+    images = np.expand_dims(np.array(images, dtype=np.float32), axis=-1)
+    labels = np.array([str(label).lower() == 'parkinson' for label in data['arr_1']], dtype=int)
+    return images, labels
+
+
+def downsample(saliency: np.ndarray, size: int = 32) -> np.ndarray:
+    h, w = saliency.shape[-2:]
+    blocks = saliency.reshape(*saliency.shape[:-2], size, h // size, size, w // size)
+    return blocks.mean(axis=(-3, -1))
+
+
+def benchmark(model, runs: int = 50, batch_size: int = 1) -> Tuple[float, float]:
+    explain = make_explainer(model)
+    images = np.random.randint(0, 256, (batch_size, 128, 128, 1)).astype(np.float32)
+
+    model.predict(images, verbose=0)
+    explain(tf.constant(images))
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        model.predict(images, verbose=0)
+    plain = (time.perf_counter() - start) / runs
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        explain(tf.constant(images))
+    explained = (time.perf_counter() - start) / runs
+    return plain, explained
+
+
+if __name__ == "__main__":
+    from tensorflow.keras.models import load_model
+
+    parser = argparse.ArgumentParser(description="Benchmark saliency overhead or fit the softmax temperature")
+    parser.add_argument('--calibrate', metavar='NPZ',
+                        help="Fit the temperature on held-out spirals (arr_0 images, arr_1 labels)")
+    args = parser.parse_args()
+
+    model = load_model('src/scribble/parkinson_disease_detection.h5')
+
+    if args.calibrate:
+        images, labels = load_calibration_set(args.calibrate)
+        probabilities = model.predict(images, verbose=0)
+        temperature = fit_temperature(probabilities, labels)
+        with open(CALIBRATION_FILE, 'w') as f:
+            json.dump({'temperature': temperature, 'samples': int(len(labels)),
+                       'source': os.path.basename(args.calibrate)}, f, indent=2)
+        print(f"Fitted temperature {temperature:.3f} on {len(labels)} held-out spirals")
+        raise SystemExit(0)
+
+    for batch_size in (1, 8, 32):
+        plain, explained = benchmark(model, batch_size=batch_size)
+        print(f"batch {batch_size:3d}  predict {plain * 1000:.2f} ms  "
+              f"explain {explained * 1000:.2f} ms  overhead {(explained / plain - 1) * 100:.1f}%")
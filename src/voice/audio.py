@@ -0,0 +1,172 @@
+import os
+import time
+import hashlib
+import argparse
+from math import gcd
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import parselmouth
+from scipy.signal import resample_poly
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+try:
+    from pydub import AudioSegment
+    from pydub.utils import mediainfo
+except ImportError:
+    AudioSegment = None
+    mediainfo = None
+
+# Pitch and formant analysis only need content below ~5.5 kHz, so uploads are
+# brought down to mono at this rate before Praat sees them.
+TARGET_RATE = int(os.environ.get("AUDIO_TARGET_RATE", 16000))
+# Frames quieter than this (dB below the loudest frame) count as silence.
+SILENCE_DB = float(os.environ.get("AUDIO_SILENCE_DB", 40))
+# Off by default: trimming shifts mean_intensity and the formant midpoint that
+# the fixed /analyze thresholds were fitted on.
+TRIM_SILENCE = os.environ.get("AUDIO_TRIM_SILENCE", "0") == "1"
+# Longest recording accepted, in seconds; 0 disables the cap.
+MAX_SECONDS = float(os.environ.get("AUDIO_MAX_SECONDS", 60))
+FRAME_SECONDS = 0.02
+
+
+class AudioTooLong(ValueError):
+    pass
+
+
+def settings_digest() -> str:
+    """Short hash of the settings that change what ``load_sound`` returns."""
+    settings = f"{TARGET_RATE}:{SILENCE_DB:g}:{int(TRIM_SILENCE)}:{FRAME_SECONDS:g}"
+    return hashlib.sha256(settings.encode()).hexdigest()[:8]
+
+
+def header_duration(file_path: str) -> Optional[float]:
+    """Length in seconds read from the container header, or None if it can't be read without decoding."""
+    if soundfile is not None:
+        try:
+            return float(soundfile.info(file_path).duration)
+        except RuntimeError:
+            pass
+    if mediainfo is not None:
+        try:
+            return float(mediainfo(file_path)['duration'])
+        except (KeyError, ValueError, OSError):
+            pass
+    return None
+
+
+def decode(file_path: str) -> Tuple[np.ndarray, int]:
+    """Decode an upload to a ``(channels, samples)`` float array and its sample rate.
+
+    Tries libsndfile (WAV/FLAC/OGG), then Praat's own readers (WAV/AIFF/FLAC/MP3),
+    then ffmpeg through pydub for compressed containers such as M4A/AAC.
+    """
+    if soundfile is not None:
+        try:
+            samples, rate = soundfile.read(file_path, dtype='float64', always_2d=True)
+            return samples.T, int(rate)
+        except RuntimeError:
+            pass
+
+    try:
+        sound = parselmouth.Sound(file_path)
+        return sound.values, int(sound.sampling_frequency)
+    except parselmouth.PraatError:
+        if AudioSegment is None:
+            raise
+
+    segment = AudioSegment.from_file(file_path)
+    samples = np.array(segment.get_array_of_samples(), dtype=np.float64)
+    samples = samples.reshape(-1, segment.channels).T / float(1 << (8 * segment.sample_width - 1))
+    return samples, int(segment.frame_rate)
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[0] == 1:
+        return samples[0]
+    return samples.mean(axis=0)
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int) -> Tuple[np.ndarray, int]:
+    # Never upsample: it costs analysis time without adding information.
+    if target_rate <= 0 or rate <= target_rate:
+        return samples, rate
+    factor = gcd(rate, target_rate)
+    return resample_poly(samples, target_rate // factor, rate // factor), target_rate
+
+
+def trim_silence(samples: np.ndarray, rate: int, threshold_db: float = SILENCE_DB) -> np.ndarray:
+    frame = max(1, int(rate * FRAME_SECONDS))
+    n_frames = len(samples) // frame
+    if n_frames < 3:
+        return samples
+
+    energy = np.mean(samples[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1)
+    peak = energy.max()
+    if peak <= 0:
+        return samples
+
+    voiced = np.flatnonzero(energy >= peak * 10 ** (-threshold_db / 10))
+    start = max(0, voiced[0] - 1) * frame
+    stop = min(n_frames, voiced[-1] + 2) * frame
+    return samples[start:stop]
+
+
+def load_sound(file_path: str, target_rate: int = TARGET_RATE, trim: bool = TRIM_SILENCE,
+               max_seconds: float = MAX_SECONDS) -> parselmouth.Sound:
+    # Reject from the header when it declares a length, before paying for the
+    # decode; the decoded length is still checked for headers that don't.
+    if max_seconds and (header_duration(file_path) or 0.0) > max_seconds:
+        raise AudioTooLong(f"Recording is longer than {max_seconds:g} seconds")
+    samples, rate = decode(file_path)
+    if max_seconds and samples.shape[-1] / rate > max_seconds:
+        raise AudioTooLong(f"Recording is longer than {max_seconds:g} seconds")
+    samples = to_mono(samples)
+    samples, rate = resample(samples, rate, target_rate)
+    if trim:
+        samples = trim_silence(samples, rate)
+    return parselmouth.Sound(np.ascontiguousarray(samples), sampling_frequency=rate)
+
+
+def _time_analysis(sound: parselmouth.Sound) -> Dict[str, float]:
+    timings = {}
+    start = time.perf_counter()
+    sound.to_pitch()
+    timings['to_pitch'] = time.perf_counter() - start
+    start = time.perf_counter()
+    sound.to_formant_burg()
+    timings['to_formant_burg'] = time.perf_counter() - start
+    return timings
+
+
+def benchmark(file_paths: List[str]) -> Dict[str, Dict[str, float]]:
+    totals = {
+        'raw': {'to_pitch': 0.0, 'to_formant_burg': 0.0},
+        'normalized': {'to_pitch': 0.0, 'to_formant_burg': 0.0},
+    }
+    for file_path in file_paths:
+        for name, sound in (('raw', parselmouth.Sound(file_path)), ('normalized', load_sound(file_path))):
+            for call, seconds in _time_analysis(sound).items():
+                totals[name][call] += seconds
+    return totals
+
+
+if __name__ == "__main__":
+    from src.voice.features import find_recordings
+
+    parser = argparse.ArgumentParser(description="Compare Praat analysis time on raw vs normalized audio")
+    parser.add_argument('corpus', help="Directory of recordings")
+    args = parser.parse_args()
+
+    paths = find_recordings(args.corpus)
+    totals = benchmark(paths)
+    for call in ('to_pitch', 'to_formant_burg'):
+        raw, normalized = totals['raw'][call], totals['normalized'][call]
+        saved = (1 - normalized / raw) * 100 if raw else 0.0
+        print(f"{call:16s} raw {raw:.3f}s  normalized {normalized:.3f}s  saved {saved:.1f}% over {len(paths)} files")
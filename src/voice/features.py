@@ -0,0 +1,190 @@
+import os
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.voice.audio import load_sound, settings_digest
+from src.profiling import timed
+
+# Bump whenever extract_features changes in a way that alters its output, so
+# stored rows computed by older code are treated as stale and recomputed.
+EXTRACTOR_REVISION = 2
+# The audio front-end settings are part of the key too, so changing
+# AUDIO_TARGET_RATE or the trimming options also invalidates stored rows.
+EXTRACTOR_VERSION = f"{EXTRACTOR_REVISION}-{settings_digest()}"
+
+FEATURE_COLUMNS: List[str] = ['mean_pitch', 'mean_intensity', 'f1', 'f2', 'f3']
+KEY_COLUMNS: List[str] = ['file_hash', 'extractor_version']
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.mp3', '.aif', '.aiff', '.ogg', '.m4a', '.aac')
+
+
+def extract_features(file_path: str) -> Dict[str, float]:
+    with timed('load_sound'):
+        sound = load_sound(file_path)
+
+    with timed('to_pitch'):
+        pitch = sound.to_pitch()
+    pitch_values = pitch.selected_array['frequency']
+    pitch_values = pitch_values[pitch_values != 0]
+    mean_pitch = np.mean(pitch_values) if len(pitch_values) > 0 else 0
+
+    with timed('to_intensity'):
+        intensity = sound.to_intensity()
+    intensity_values = intensity.values
+    mean_intensity = np.mean(intensity_values)
+
+    with timed('to_formant_burg'):
+        formants = sound.to_formant_burg()
+    midpoint = sound.duration / 2
+
+    f1 = formants.get_value_at_time(1, midpoint)
+    f2 = formants.get_value_at_time(2, midpoint)
+    f3 = formants.get_value_at_time(3, midpoint)
+
+    return {
+        'mean_pitch': float(mean_pitch),
+        'mean_intensity': float(mean_intensity),
+        'f1': float(f1),
+        'f2': float(f2),
+        'f3': float(f3),
+    }
+
+
+def file_digest(file_path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_recordings(root: str) -> List[str]:
+    paths = []
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.lower().endswith(AUDIO_EXTENSIONS):
+                paths.append(os.path.join(directory, filename))
+    return sorted(paths)
+
+
+def _extract_row(item):
+    file_hash, file_path = item
+    row = {'file_hash': file_hash, 'extractor_version': EXTRACTOR_VERSION}
+    try:
+        row.update(extract_features(file_path))
+    except Exception as e:
+        print(f"Could not extract features from {file_path}: {str(e)}")
+        return None
+    return row
+
+
+class FeatureStore:
+    """Parquet-backed cache of acoustic features keyed by file hash and extractor version.
+
+    Feeds the threshold search for the ``/analyze`` rule through
+    ``genetic.py --manifest``.
+    """
+
+    def __init__(self, path: str = 'feature_store.parquet'):
+        self.path = path
+        self._frame: Optional[pd.DataFrame] = None
+
+    def load(self) -> pd.DataFrame:
+        if self._frame is None:
+            if os.path.exists(self.path):
+                self._frame = pd.read_parquet(self.path)
+                # Stores written before versions became strings hold integers.
+                self._frame['extractor_version'] = self._frame['extractor_version'].astype(str)
+            else:
+                self._frame = pd.DataFrame(columns=KEY_COLUMNS + FEATURE_COLUMNS)
+        return self._frame
+
+    def save(self) -> None:
+        frame = self.load()
+        tmp_path = f"{self.path}.tmp"
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+    def update(self, file_paths: Iterable[str], workers: int = 1) -> pd.DataFrame:
+        """Extract features for any file whose (hash, version) is not stored yet.
+
+        Returns one row per input path, in input order, with a ``path`` column.
+        """
+        file_paths = list(file_paths)
+        hashes = [file_digest(p) for p in file_paths]
+
+        frame = self.load()
+        current = frame[frame['extractor_version'] == EXTRACTOR_VERSION]
+        known = set(current['file_hash'])
+
+        pending = {}
+        for file_hash, file_path in zip(hashes, file_paths):
+            if file_hash not in known and file_hash not in pending:
+                pending[file_hash] = file_path
+
+        if pending:
+            items = list(pending.items())
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    rows = list(executor.map(_extract_row, items, chunksize=8))
+            else:
+                rows = [_extract_row(item) for item in items]
+            rows = [row for row in rows if row is not None]
+
+            computed = pd.DataFrame(rows, columns=KEY_COLUMNS + FEATURE_COLUMNS)
+            # Only fully finite rows are cached; failed extractions and NaN
+            # formants are retried on the next update.
+            complete = np.isfinite(computed[FEATURE_COLUMNS].to_numpy(dtype=np.float64)).all(axis=1)
+            fresh, uncached = computed[complete], computed[~complete]
+
+            if len(fresh):
+                # Rows from older extractor versions for the same files are stale.
+                stale = frame['file_hash'].isin(fresh['file_hash'])
+                self._frame = pd.concat([frame[~stale], fresh], ignore_index=True)
+                self.save()
+            print(f"Extracted {len(fresh)} of {len(items)} new recordings "
+                  f"({len(file_paths) - len(items)} cached, {len(items) - len(fresh)} incomplete)")
+
+        return self.lookup(hashes, file_paths, extra=uncached if pending else None)
+
+    def lookup(self, hashes: List[str], file_paths: Optional[List[str]] = None,
+               extra: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """One row per hash, in order. Features are NaN where nothing could be extracted."""
+        frame = self.load()
+        current = frame[frame['extractor_version'] == EXTRACTOR_VERSION]
+        if extra is not None and len(extra):
+            current = pd.concat([current, extra], ignore_index=True)
+        current = current.drop_duplicates('file_hash', keep='last').set_index('file_hash')
+        result = current.reindex(hashes).reset_index()
+        if file_paths is not None:
+            result.insert(0, 'path', file_paths)
+        result['complete'] = np.isfinite(result[FEATURE_COLUMNS].to_numpy(dtype=np.float64)).all(axis=1)
+        return result
+
+    def matrix(self, file_paths: Iterable[str], workers: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Return an ``(N, len(FEATURE_COLUMNS))`` feature matrix and an ``(N,)`` mask of complete rows.
+
+        Rows stay aligned with ``file_paths``; incomplete rows hold NaN, so
+        filter both the matrix and any labels with the mask.
+        """
+        features = self.update(file_paths, workers=workers)
+        return features[FEATURE_COLUMNS].to_numpy(dtype=np.float64), features['complete'].to_numpy()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract acoustic features for a corpus of recordings")
+    parser.add_argument('corpus', help="Directory of recordings")
+    parser.add_argument('--store', default='feature_store.parquet')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--output', help="Optional CSV export of the corpus features")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.store)
+    features = store.update(find_recordings(args.corpus), workers=args.workers)
+    print(features.describe())
+    if args.output:
+        features.to_csv(args.output, index=False)
@@ -1,85 +1,140 @@
-import random
+import os
+import argparse
 import pandas as pd
-from deap import base, creator, tools, algorithms
 from sklearn.metrics import accuracy_score
-from sklearn.model_selection import KFold
 import numpy as np
 
+from src.voice import heuristic
+from src.voice.features import FeatureStore
+from src.voice.search import ThresholdSearch, cross_validate
 
-df = pd.read_csv('E:/Projects/Hackathon Projects/NeuroTone/V3/train_data.csv')  
 
-def heuristic_evaluation(individual):
- 
-    jitter_rel_threshold, shim_loc_threshold, shim_db_threshold, hnr_threshold, rpde_threshold, dfa_threshold, ppe_threshold = individual
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train_data.csv')
 
-
-    def apply_heuristic(row):
-        jitter_condition = row['Jitter_rel'] > jitter_rel_threshold
-        shim_condition = row['Shim_loc'] > shim_loc_threshold or row['Shim_dB'] > shim_db_threshold
-        hnr_condition = row['HNR05'] < hnr_threshold
-        rpde_condition = row['RPDE'] > rpde_threshold
-        dfa_condition = row['DFA'] > dfa_threshold
-        ppe_condition = row['PPE'] > ppe_threshold
-
-        if jitter_condition and shim_condition and (hnr_condition or rpde_condition or dfa_condition or ppe_condition):
-            return 1  
-        else:
-            return 0  
-
-
-    kf = KFold(n_splits=5) 
-    accuracies = []
-    for train_index, test_index in kf.split(df):
-        train, test = df.iloc[train_index], df.iloc[test_index]
-        predictions = test.apply(apply_heuristic, axis=1)
-        accuracy = accuracy_score(test['Status'], predictions)
-        accuracies.append(accuracy)
-
-    return np.mean(accuracies),
-
-
-creator.create("FitnessMax", base.Fitness, weights=(1.0,))
-creator.create("Individual", list, fitness=creator.FitnessMax)
-toolbox = base.Toolbox()
-toolbox.register("attr_float", random.uniform, 0, 1)  
-toolbox.register("individual", tools.initRepeat, creator.Individual, toolbox.attr_float, n=7) 
-toolbox.register("population", tools.initRepeat, list, toolbox.individual)
-toolbox.register("evaluate", heuristic_evaluation)
-toolbox.register("mate", tools.cxTwoPoint)
-toolbox.register("mutate", tools.mutGaussian, mu=0, sigma=1, indpb=0.2) 
-toolbox.register("select", tools.selTournament, tournsize=3)
-
-def optimizeHeuristic():
-    population = toolbox.population(n=200)  
-    ngen = 200  
-    cxpb = 0.8  
-    mutpb = 0.4  
-
-    algorithms.eaSimple(population, toolbox, cxpb, mutpb, ngen, verbose=True)
-
-    best_ind = tools.selBest(population, 1)[0]
-    return best_ind
-
-
-best_heuristic = optimizeHeuristic()
-print(f"Best Heuristic Thresholds: {best_heuristic}")
-
-
-def ga_optimized_parkinsons_heuristic(row, thresholds):
-    jitter_rel_threshold, shim_loc_threshold, shim_db_threshold, hnr_threshold, rpde_threshold, dfa_threshold, ppe_threshold = thresholds
-
-    jitter_condition = row['Jitter_rel'] > jitter_rel_threshold
-    shim_condition = row['Shim_loc'] > shim_loc_threshold or row['Shim_dB'] > shim_db_threshold
-    hnr_condition = row['HNR05'] < hnr_threshold
-    rpde_condition = row['RPDE'] > rpde_threshold
-    dfa_condition = row['DFA'] > dfa_threshold
-    ppe_condition = row['PPE'] > ppe_threshold
-
-    if jitter_condition and shim_condition and (hnr_condition or rpde_condition or dfa_condition or ppe_condition):
-        return 1  
+# Columns of train_data.csv filling the seven threshold slots of the rule
+# below. The original rule was written for Jitter_rel, Shim_loc, Shim_dB,
+# HNR05, RPDE, DFA and PPE; this dataset has no RPDE/DFA/PPE, so the last
+# three "any of" slots use the nearest voice-quality measures it does have.
+FEATURES = [
+    'jitter_loc',            # Jitter_rel
+    'shimmer_loc',           # Shim_loc
+    'shimmer_locdb',         # Shim_dB
+    'htn',                   # HNR05 (harmonics-to-noise ratio)
+    'nth',                   # noise-to-harmonics ratio
+    'std_dev',               # pitch variability
+    'degree_of_voicebreak',  # voice breaks
+]
+LABEL = 'class_info'
+GROUP = 'subject_id'
+
+
+def check_columns(df, columns=FEATURES + [LABEL, GROUP]):
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"Training data is missing required columns: {', '.join(missing)}")
+
+
+def load_manifest(manifest_path, store_path='feature_store.parquet', workers=1):
+    """Build X, y and groups for the ``/analyze`` rule from raw recordings.
+
+    The manifest is a CSV with ``path``, ``class_info`` and ``subject_id``
+    columns; relative paths are resolved against the manifest's directory.
+    Features come from the ``FeatureStore``, so only new recordings are
+    extracted. Recordings without a complete feature row are dropped.
+    """
+    manifest = pd.read_csv(manifest_path)
+    check_columns(manifest, ['path', LABEL, GROUP])
+    root = os.path.dirname(os.path.abspath(manifest_path))
+    paths = [os.path.join(root, path) for path in manifest['path']]
+
+    X, complete = FeatureStore(store_path).matrix(paths, workers=workers)
+    if not complete.all():
+        print(f"Skipping {int((~complete).sum())} recordings without complete features")
+    return X[complete], manifest[LABEL].to_numpy()[complete], manifest[GROUP].to_numpy()[complete]
+
+
+def ga_optimized_parkinsons_heuristic(X, thresholds, directions=None):
+    # Vectorized over samples (rows of X) and candidates (rows of thresholds).
+    X = np.asarray(X, dtype=np.float64)
+    T = np.atleast_2d(np.asarray(thresholds, dtype=np.float64))
+
+    def above(j):
+        return X[np.newaxis, :, j] > T[:, j, np.newaxis]
+
+    def below(j):
+        return X[np.newaxis, :, j] < T[:, j, np.newaxis]
+
+    jitter_condition = above(0)
+    shim_condition = above(1) | above(2)
+    other_condition = below(3) | above(4) | above(5) | above(6)
+
+    predictions = (jitter_condition & shim_condition & other_condition).astype(np.int8)
+    return predictions[0] if np.ndim(thresholds) == 1 else predictions
+
+
+def search_thresholds(X, y, groups, predict_fn, strategy='genetic', workers=None, validate=True, **kwargs):
+    """Search thresholds on all rows; with ``validate`` also return per-fold held-out accuracy.
+
+    The returned fitness is the search's own in-sample score. The held-out
+    scores come from rerunning the search inside each outer fold.
+    """
+    held_out = None
+    if validate:
+        held_out = cross_validate(X, y, groups, strategy=strategy, predict_fn=predict_fn, workers=workers, **kwargs)
+
+    search = ThresholdSearch(X, y, groups, n_splits=5, predict_fn=predict_fn, workers=workers)
+    best, fitness = search.run(strategy, **kwargs)
+
+    total = sum(entry['seconds'] for entry in search.history)
+    print(f"Search finished in {total:.2f}s over {len(search.history)} generations")
+    return best, fitness, held_out
+
+
+def optimizeHeuristic(df, strategy='genetic', workers=None, validate=True, **kwargs):
+    check_columns(df)
+    return search_thresholds(df[FEATURES].to_numpy(), df[LABEL].to_numpy(), df[GROUP].to_numpy(),
+                             ga_optimized_parkinsons_heuristic, strategy=strategy, workers=workers,
+                             validate=validate, **kwargs)
+
+
+def optimizeAnalyzeThresholds(manifest_path, store_path='feature_store.parquet', strategy='genetic',
+                              workers=None, validate=True, **kwargs):
+    """Search the ``/analyze`` thresholds (``heuristic.THRESHOLD_KEYS``) on recordings listed in a manifest."""
+    X, y, groups = load_manifest(manifest_path, store_path, workers=workers or os.cpu_count() or 1)
+    best, fitness, held_out = search_thresholds(X, y, groups, heuristic.predict, strategy=strategy,
+                                                workers=workers, validate=validate, **kwargs)
+    return dict(zip(heuristic.THRESHOLD_KEYS, map(float, best))), fitness, held_out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search heuristic thresholds with subject-grouped CV")
+    parser.add_argument('data', nargs='?', default=DEFAULT_DATA)
+    parser.add_argument('--manifest', help="CSV of recordings (path, class_info, subject_id); "
+                                           "searches the /analyze thresholds instead of the CSV rule")
+    parser.add_argument('--store', default='feature_store.parquet')
+    parser.add_argument('--strategy', choices=['genetic', 'random', 'coordinate'], default='genetic')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--skip-cv', action='store_true', help="Skip the per-fold held-out evaluation")
+    args = parser.parse_args()
+
+    def report(fitness, held_out):
+        print(f"Search fitness (in-sample): {fitness}")
+        if held_out is not None:
+            print(f"Grouped CV accuracy (held-out subjects): {held_out.mean():.4f} +/- {held_out.std():.4f}")
+
+    if args.manifest:
+        thresholds, fitness, held_out = optimizeAnalyzeThresholds(
+            args.manifest, args.store, strategy=args.strategy, workers=args.workers, validate=not args.skip_cv)
+        print(f"Best /analyze thresholds: {thresholds}")
+        report(fitness, held_out)
     else:
-        return 0 
+        df = pd.read_csv(args.data)
+
+        best_heuristic, fitness, held_out = optimizeHeuristic(df, strategy=args.strategy, workers=args.workers,
+                                                              validate=not args.skip_cv)
+        print(f"Best Heuristic Thresholds: {list(best_heuristic)}")
+        report(fitness, held_out)
 
-df['Predicted_GA'] = df.apply(ga_optimized_parkinsons_heuristic, thresholds=best_heuristic, axis=1)
-accuracy_ga = accuracy_score(df['Status'], df['Predicted_GA'])
-print(f"Accuracy with GA Optimized Heuristic: {accuracy_ga}")
\ No newline at end of file
+        df['Predicted_GA'] = ga_optimized_parkinsons_heuristic(df[FEATURES].to_numpy(), best_heuristic)
+        accuracy_ga = accuracy_score(df[LABEL], df['Predicted_GA'])
+        print(f"Accuracy with GA Optimized Heuristic: {accuracy_ga}")
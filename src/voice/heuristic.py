@@ -0,0 +1,139 @@
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Order of the columns in every feature matrix and threshold vector below.
+# Matches src.voice.features.FEATURE_COLUMNS.
+THRESHOLD_KEYS = ['pitch', 'intensity', 'f1', 'f2', 'f3']
+
+THRESHOLDS: Dict[str, float] = {
+    'pitch': 116.09,
+    'intensity': 67.89,
+    'f1': 1343.93,
+    'f2': 1688.41,
+    'f3': 1495.40
+}
+
+# -1: the feature must be below its threshold, +1: above. Same rule as
+# main.heuristic_model.
+DIRECTIONS = np.array([-1.0, -1.0, 1.0, 1.0, 1.0])
+
+# Upper bound on the number of (candidate, sample) cells held in memory at once.
+_CHUNK_CELLS = 1 << 22
+
+ThresholdsLike = Union[Dict[str, float], Sequence[float], np.ndarray]
+
+
+def threshold_vector(thresholds: ThresholdsLike) -> np.ndarray:
+    if isinstance(thresholds, dict):
+        return np.array([thresholds[key] for key in THRESHOLD_KEYS], dtype=np.float64)
+    return np.asarray(thresholds, dtype=np.float64)
+
+
+def margins(features: np.ndarray, thresholds: ThresholdsLike) -> np.ndarray:
+    """Signed distance of each feature from its threshold (``feature - threshold``).
+
+    ``features`` is ``(N, F)``; ``thresholds`` is ``(F,)`` giving ``(N, F)`` or
+    ``(M, F)`` giving ``(M, N, F)``. These are the ``differences`` reported by
+    ``/analyze``, unrounded. For large batches use ``min_margin`` instead.
+    """
+    X = np.asarray(features, dtype=np.float64)
+    T = threshold_vector(thresholds)
+    if T.ndim == 1:
+        return X - T
+    return X[np.newaxis, :, :] - T[:, np.newaxis, :]
+
+
+def predict(features: np.ndarray, thresholds: ThresholdsLike,
+            directions: Optional[np.ndarray] = None) -> np.ndarray:
+    """Vectorized ``heuristic_model``: 1 where every feature is past its threshold.
+
+    Returns ``(N,)`` for a single threshold vector and ``(M, N)`` for an
+    ``(M, F)`` batch of candidates. Never materialises ``(M, N, F)``.
+    """
+    X = np.asarray(features, dtype=np.float64)
+    T = threshold_vector(thresholds)
+    d = DIRECTIONS if directions is None else np.asarray(directions, dtype=np.float64)
+
+    single = T.ndim == 1
+    T = np.atleast_2d(T)
+    Xd = X * d
+    Td = T * d
+
+    out = np.empty((T.shape[0], X.shape[0]), dtype=np.int8)
+    step = max(1, _CHUNK_CELLS // max(1, X.shape[0]))
+    for start in range(0, T.shape[0], step):
+        chunk = Td[start:start + step]
+        hit = np.ones((chunk.shape[0], X.shape[0]), dtype=bool)
+        for j in range(X.shape[1]):
+            hit &= Xd[np.newaxis, :, j] > chunk[:, j, np.newaxis]
+        out[start:start + step] = hit
+    return out[0] if single else out
+
+
+def min_margin(features: np.ndarray, thresholds: ThresholdsLike,
+               directions: Optional[np.ndarray] = None,
+               scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """Smallest signed margin ``direction * (feature - threshold) / scale`` per sample.
+
+    Positive exactly where ``predict`` returns 1. ``(N,)`` for one threshold
+    vector, ``(M, N)`` for a batch, computed in the same chunks as ``predict``.
+    """
+    X = np.asarray(features, dtype=np.float64)
+    T = threshold_vector(thresholds)
+    d = DIRECTIONS if directions is None else np.asarray(directions, dtype=np.float64)
+    if scales is not None:
+        d = d / np.asarray(scales, dtype=np.float64)
+
+    single = T.ndim == 1
+    T = np.atleast_2d(T)
+    Xd = X * d
+    Td = T * d
+
+    out = np.empty((T.shape[0], X.shape[0]), dtype=np.float64)
+    step = max(1, _CHUNK_CELLS // max(1, X.shape[0]))
+    for start in range(0, T.shape[0], step):
+        chunk = Td[start:start + step]
+        lowest = np.full((chunk.shape[0], X.shape[0]), np.inf)
+        for j in range(X.shape[1]):
+            np.minimum(lowest, Xd[np.newaxis, :, j] - chunk[:, j, np.newaxis], out=lowest)
+        out[start:start + step] = lowest
+    return out[0] if single else out
+
+
+def score(features: np.ndarray, thresholds: ThresholdsLike,
+          directions: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Return ``(predictions, margins)`` for one or many threshold vectors.
+
+    For a single vector the margins are the full per-feature ``(N, F)``
+    differences. For an ``(M, F)`` batch they are reduced to the ``(M, N)``
+    ``min_margin`` so memory stays bounded by the chunk size.
+    """
+    if threshold_vector(thresholds).ndim == 1:
+        return predict(features, thresholds, directions), margins(features, thresholds)
+    return predict(features, thresholds, directions), min_margin(features, thresholds, directions)
+
+
+# Hand-picked guesses at the spread of each feature across recordings, used
+# to put margins in comparable units before squashing. Nothing has been
+# fitted, so the resulting scores rank how clearly a rule fired and say
+# nothing about how likely a diagnosis is.
+MARGIN_SCALES = np.array([20.0, 5.0, 150.0, 250.0, 300.0])
+
+
+def explain(features: np.ndarray, thresholds: ThresholdsLike,
+            scales: Optional[np.ndarray] = None,
+            directions: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Margin-based scores for a single threshold vector.
+
+    Each feature gets ``sigmoid(direction * margin / scale)``: 0.5 at the
+    threshold, towards 1 the further it is on the Parkinson's side. The overall
+    score is the minimum over features, so it crosses 0.5 exactly where
+    ``predict`` flips. These are uncalibrated scores, not probabilities.
+    Returns ``(score (N,), feature_scores (N, F))``.
+    """
+    d = DIRECTIONS if directions is None else np.asarray(directions, dtype=np.float64)
+    s = MARGIN_SCALES if scales is None else np.asarray(scales, dtype=np.float64)
+    z = np.atleast_2d(margins(features, thresholds)) * d / s
+    feature_scores = 1.0 / (1.0 + np.exp(-z))
+    return feature_scores.min(axis=1), feature_scores
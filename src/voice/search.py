@@ -0,0 +1,225 @@
+import os
+import time
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from deap import base, creator, tools, algorithms
+from sklearn.model_selection import GroupKFold
+
+from src.voice import heuristic
+
+PredictFn = Callable[..., np.ndarray]
+
+# Per-process copies of the data, installed once by _init_worker so tasks only
+# ship candidate batches.
+_state: Dict[str, object] = {}
+
+
+def _init_worker(X, y, folds, predict_fn, directions):
+    _state['X'] = X
+    _state['y'] = y
+    _state['folds'] = folds
+    _state['predict_fn'] = predict_fn
+    _state['directions'] = directions
+
+
+def _fold_accuracy(task):
+    fold, start, candidates = task
+    test_index = _state['folds'][fold]
+    X = _state['X'][test_index]
+    y = _state['y'][test_index]
+    predictions = _state['predict_fn'](X, candidates, _state['directions'])
+    return fold, start, (predictions == y[np.newaxis, :]).mean(axis=1)
+
+
+class ThresholdSearch:
+    """Score threshold candidates over subject-grouped folds.
+
+    Fitness of a candidate is its mean accuracy over the folds of a
+    ``GroupKFold`` split. Candidates are fixed rules, so this is an in-sample
+    figure for the rows the search sees; use ``cross_validate`` for held-out
+    accuracy. Fold x candidate-chunk evaluations run in a process pool when
+    ``workers > 1``.
+    """
+
+    def __init__(self, X: np.ndarray, y: np.ndarray, groups: np.ndarray,
+                 n_splits: int = 5, predict_fn: PredictFn = heuristic.predict,
+                 directions: Optional[np.ndarray] = None,
+                 bounds: Optional[np.ndarray] = None,
+                 workers: Optional[int] = None, chunk_size: int = 512):
+        self.X = np.asarray(X, dtype=np.float64)
+        self.y = np.asarray(y).astype(np.int8)
+        self.groups = np.asarray(groups)
+        self.predict_fn = predict_fn
+        self.directions = directions
+        self.folds = [test for _, test in GroupKFold(n_splits=n_splits).split(self.X, self.y, self.groups)]
+        if bounds is None:
+            bounds = np.stack([self.X.min(axis=0), self.X.max(axis=0)], axis=1)
+        self.bounds = np.asarray(bounds, dtype=np.float64)
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self.history: List[Dict[str, float]] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.X, self.y, self.folds, self.predict_fn, self.directions),
+            )
+        else:
+            _init_worker(self.X, self.y, self.folds, self.predict_fn, self.directions)
+        return self
+
+    def __exit__(self, *exc):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def evaluate(self, candidates: np.ndarray) -> np.ndarray:
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=np.float64))
+        if self._executor is None and _state.get('X') is not self.X:
+            # Used outside ``with``: evaluate serially in this process.
+            _init_worker(self.X, self.y, self.folds, self.predict_fn, self.directions)
+        tasks = [
+            (fold, start, candidates[start:start + self.chunk_size])
+            for fold in range(len(self.folds))
+            for start in range(0, len(candidates), self.chunk_size)
+        ]
+        scores = np.empty((len(self.folds), len(candidates)))
+        if self._executor is not None:
+            results = self._executor.map(_fold_accuracy, tasks)
+        else:
+            results = map(_fold_accuracy, tasks)
+        for fold, start, accuracy in results:
+            scores[fold, start:start + len(accuracy)] = accuracy
+        return scores.mean(axis=0)
+
+    def run(self, strategy: str = 'genetic', **kwargs) -> Tuple[np.ndarray, float]:
+        strategies = {
+            'genetic': self.genetic,
+            'random': self.random_search,
+            'coordinate': self.coordinate_descent,
+        }
+        if strategy not in strategies:
+            raise ValueError(f"Unknown search strategy: {strategy}")
+        with self:
+            return strategies[strategy](**kwargs)
+
+    def from_unit(self, u: np.ndarray) -> np.ndarray:
+        low, high = self.bounds[:, 0], self.bounds[:, 1]
+        return low + np.clip(u, 0.0, 1.0) * (high - low)
+
+    def _record(self, generation: int, fitness: np.ndarray, started: float) -> None:
+        entry = {
+            'generation': generation,
+            'evaluations': int(len(fitness)),
+            'best': float(np.max(fitness)),
+            'mean': float(np.mean(fitness)),
+            'seconds': time.perf_counter() - started,
+        }
+        self.history.append(entry)
+        print(f"gen {generation:4d}  evals {entry['evaluations']:6d}  best {entry['best']:.4f}  "
+              f"mean {entry['mean']:.4f}  {entry['seconds']:.3f}s")
+
+    def random_search(self, n_candidates: int = 100000, batch_size: int = 10000,
+                      seed: Optional[int] = None) -> Tuple[np.ndarray, float]:
+        rng = np.random.default_rng(seed)
+        best, best_fitness = None, -np.inf
+        for generation, start in enumerate(range(0, n_candidates, batch_size)):
+            started = time.perf_counter()
+            size = min(batch_size, n_candidates - start)
+            candidates = self.from_unit(rng.random((size, self.X.shape[1])))
+            fitness = self.evaluate(candidates)
+            i = int(np.argmax(fitness))
+            if fitness[i] > best_fitness:
+                best, best_fitness = candidates[i], float(fitness[i])
+            self._record(generation, fitness, started)
+        return best, best_fitness
+
+    def coordinate_descent(self, initial: Optional[Sequence[float]] = None, grid_size: int = 256,
+                           rounds: int = 5) -> Tuple[np.ndarray, float]:
+        best = (self.bounds.mean(axis=1) if initial is None
+                else np.asarray(initial, dtype=np.float64).copy())
+        best_fitness = float(self.evaluate(best)[0])
+        for generation in range(rounds):
+            started = time.perf_counter()
+            improved = False
+            for j in range(len(best)):
+                candidates = np.repeat(best[np.newaxis, :], grid_size, axis=0)
+                candidates[:, j] = np.linspace(self.bounds[j, 0], self.bounds[j, 1], grid_size)
+                fitness = self.evaluate(candidates)
+                i = int(np.argmax(fitness))
+                if fitness[i] > best_fitness:
+                    best, best_fitness = candidates[i], float(fitness[i])
+                    improved = True
+            self._record(generation, np.array([best_fitness]), started)
+            if not improved:
+                break
+        return best, best_fitness
+
+    def genetic(self, population_size: int = 200, generations: int = 200, cxpb: float = 0.8,
+                mutpb: float = 0.4, sigma: float = 0.1, seed: Optional[int] = None) -> Tuple[np.ndarray, float]:
+        if seed is not None:
+            random.seed(seed)
+        if not hasattr(creator, "FitnessMax"):
+            creator.create("FitnessMax", base.Fitness, weights=(1.0,))
+        if not hasattr(creator, "Individual"):
+            creator.create("Individual", list, fitness=creator.FitnessMax)
+
+        # Individuals live in the unit cube and are mapped onto self.bounds.
+        toolbox = base.Toolbox()
+        toolbox.register("attr_float", random.uniform, 0, 1)
+        toolbox.register("individual", tools.initRepeat, creator.Individual, toolbox.attr_float, n=self.X.shape[1])
+        toolbox.register("population", tools.initRepeat, list, toolbox.individual)
+        toolbox.register("mate", tools.cxTwoPoint)
+        toolbox.register("mutate", tools.mutGaussian, mu=0, sigma=sigma, indpb=0.2)
+        toolbox.register("select", tools.selTournament, tournsize=3)
+
+        def evaluate_population(individuals):
+            invalid = [ind for ind in individuals if not ind.fitness.valid]
+            if invalid:
+                fitness = self.evaluate(self.from_unit(np.array(invalid)))
+                for ind, value in zip(invalid, fitness):
+                    ind.fitness.values = (float(value),)
+            return len(invalid)
+
+        population = toolbox.population(n=population_size)
+        hall_of_fame = tools.HallOfFame(1)
+        for generation in range(generations + 1):
+            started = time.perf_counter()
+            if generation > 0:
+                offspring = toolbox.select(population, len(population))
+                population = algorithms.varAnd(offspring, toolbox, cxpb, mutpb)
+            evaluate_population(population)
+            hall_of_fame.update(population)
+            self._record(generation, np.array([ind.fitness.values[0] for ind in population]), started)
+
+        best = hall_of_fame[0]
+        return self.from_unit(np.array(best)), float(best.fitness.values[0])
+
+
+def cross_validate(X: np.ndarray, y: np.ndarray, groups: np.ndarray, strategy: str = 'genetic',
+                   n_splits: int = 5, predict_fn: PredictFn = heuristic.predict,
+                   directions: Optional[np.ndarray] = None, workers: Optional[int] = None,
+                   **kwargs) -> np.ndarray:
+    """Held-out accuracy of the whole search, one value per outer ``GroupKFold`` fold.
+
+    Each fold runs the search on its training subjects only and scores the
+    winning thresholds on its held-out subjects, which the search never saw.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y).astype(np.int8)
+    groups = np.asarray(groups)
+    scores = []
+    for fold, (train, test) in enumerate(GroupKFold(n_splits=n_splits).split(X, y, groups)):
+        search = ThresholdSearch(X[train], y[train], groups[train], n_splits=n_splits,
+                                 predict_fn=predict_fn, directions=directions, workers=workers)
+        best, _ = search.run(strategy, **kwargs)
+        scores.append(float(np.mean(predict_fn(X[test], best, directions) == y[test])))
+        print(f"outer fold {fold}: held-out accuracy {scores[-1]:.4f} "
+              f"on {len(np.unique(groups[test]))} subjects")
+    return np.array(scores)